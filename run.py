@@ -6,33 +6,106 @@ Provides a simple interface to run all tools
 Version: 0.1
 """
 
+import os
 import sys
+import importlib
+import logging
 import subprocess
 from pathlib import Path
 
+SCRIPTS_DIR = Path(__file__).parent / "scripts"
+
+# Non-interactive mode (PKA_NONINTERACTIVE=1) for driving the launcher from
+# pipelines: the menu choice is read from PKA_MENU_CHOICE, runs once, no
+# "Press Enter" prompt is shown, and the exit code reports whether it worked
+NONINTERACTIVE = os.getenv('PKA_NONINTERACTIVE') == '1'
+
+# Script paths resolved once at startup; only scripts present are runnable
+SCRIPT_TABLE = {
+    script_name: SCRIPTS_DIR / script_name
+    for script_name in ("validate_setup.py", "pka_capture.py", "mark_scanner.py", "batch_process.py")
+    if (SCRIPTS_DIR / script_name).exists()
+}
+
+MENU = "\n".join([
+    "=" * 60,
+    "PACKET TRACER MARK SCANNER",
+    "=" * 60,
+    "Choose an option:",
+    "",
+    "1. Validate Setup",
+    "2. Capture PKA Screenshots",
+    "3. Scan Marks (Individual or All Students)",
+    "4. Batch Process (Capture + Scan)",
+    "5. Exit",
+    "",
+    "",
+])
+
 def print_menu():
     """Print the main menu"""
-    print("=" * 60)
-    print("PACKET TRACER MARK SCANNER")
-    print("=" * 60)
-    print("Choose an option:")
-    print()
-    print("1. Validate Setup")
-    print("2. Capture PKA Screenshots")
-    print("3. Scan Marks (Individual or All Students)")
-    print("4. Batch Process (Capture + Scan)")
-    print("5. Exit")
-    print()
+    sys.stdout.write(MENU)
+    sys.stdout.flush()
+
+def _exit_code(exc):
+    """Convert a SystemExit raised by a tool into a process-style return code"""
+    if exc.code is None:
+        return 0
+    if isinstance(exc.code, int):
+        return exc.code
+    print(exc.code)
+    return 1
 
-def run_script(script_name):
-    """Run a script from the scripts directory"""
-    scripts_dir = Path(__file__).parent / "scripts"
-    script_path = scripts_dir / script_name
+def run_script(script_name, isolated=False):
+    """Run a script from the scripts directory
+
+    Tools are imported and their main() is called in-process, so the
+    interpreter and heavy imports (OpenCV, Tesseract bindings) are reused
+    across menu actions. Pass isolated=True to run the script in a
+    separate interpreter instead.
+    """
+    script_path = SCRIPT_TABLE.get(script_name)
     
-    if not script_path.exists():
+    if script_path is None:
         print(f"❌ Error: {script_name} not found in scripts directory")
         return False
     
+    if isolated:
+        return _run_script_subprocess(script_path)
+    
+    # Scripts import their siblings (e.g. config) by bare module name
+    if str(SCRIPTS_DIR) not in sys.path:
+        sys.path.insert(0, str(SCRIPTS_DIR))
+    
+    root_logger = logging.getLogger()
+    handlers_before = list(root_logger.handlers)
+    level_before = root_logger.level
+    
+    try:
+        module = importlib.import_module(script_path.stem)
+        result = module.main()
+        return_code = 1 if result is False else 0
+    except SystemExit as e:
+        return_code = _exit_code(e)
+    except KeyboardInterrupt:
+        print("\n⚠️ Script interrupted by user")
+        return False
+    finally:
+        # Each tool sets up logging to its own file; remove what this one
+        # added so the next tool run from the menu doesn't log into it
+        for handler in root_logger.handlers[:]:
+            if handler not in handlers_before:
+                root_logger.removeHandler(handler)
+                handler.close()
+        root_logger.setLevel(level_before)
+    
+    if return_code != 0:
+        print(f"❌ Script failed with exit code {return_code}")
+        return False
+    return True
+
+def _run_script_subprocess(script_path):
+    """Run a script in a fresh Python interpreter"""
     try:
         result = subprocess.run([sys.executable, str(script_path)], check=True)
         return result.returncode == 0
@@ -49,23 +122,26 @@ def main():
         print_menu()
         
         try:
-            choice = input("Enter your choice (1-5): ").strip()
+            if NONINTERACTIVE:
+                choice = os.getenv('PKA_MENU_CHOICE', '5').strip()
+            else:
+                choice = input("Enter your choice (1-5): ").strip()
             
             if choice == "1":
                 print("\n🔍 Running setup validation...")
-                run_script("validate_setup.py")
+                succeeded = run_script("validate_setup.py")
                 
             elif choice == "2":
                 print("\n📸 Running PKA capture tool...")
-                run_script("pka_capture.py")
+                succeeded = run_script("pka_capture.py")
                 
             elif choice == "3":
                 print("\n🔍 Running mark scanner (with individual and batch options)...")
-                run_script("mark_scanner.py")
+                succeeded = run_script("mark_scanner.py")
                 
             elif choice == "4":
                 print("\n🚀 Running batch processor...")
-                run_script("batch_process.py")
+                succeeded = run_script("batch_process.py")
                 
             elif choice == "5":
                 print("\n👋 Goodbye!")
@@ -73,8 +149,12 @@ def main():
                 
             else:
                 print("❌ Invalid choice. Please enter 1-5.")
+                if NONINTERACTIVE:
+                    sys.exit(2)
                 continue
                 
+            if NONINTERACTIVE:
+                sys.exit(0 if succeeded else 1)
             input("\nPress Enter to continue...")
             
         except KeyboardInterrupt:
@@ -82,6 +162,8 @@ def main():
             break
         except Exception as e:
             print(f"❌ Error: {e}")
+            if NONINTERACTIVE:
+                sys.exit(1)
             input("\nPress Enter to continue...")
 
 if __name__ == "__main__":
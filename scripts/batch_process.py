@@ -9,7 +9,6 @@ Version: 0.1
 import os
 import sys
 import time
-import subprocess
 from pathlib import Path
 import logging
 
@@ -18,94 +17,144 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from config import get_config
 
 config = get_config()
+_log = logging.getLogger(__name__)
 
-# Setup logging
-config.create_directories()
-log_filename = config.get_log_filename('batch_process')
-logging.basicConfig(
-    level=getattr(logging, config.LOG_LEVEL),
-    format=config.LOG_FORMAT,
-    handlers=[
-        logging.FileHandler(log_filename, encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+SCRIPTS_DIR = Path(__file__).parent
+CAPTURE_SCRIPT = SCRIPTS_DIR / 'pka_capture.py'
+SCANNER_SCRIPT = SCRIPTS_DIR / 'mark_scanner.py'
+
+# Result count from which CSV export switches to pandas (if installed)
+PANDAS_CSV_MIN_ROWS = 500
+
+# Console banners, each written with a single call
+BATCH_HEADER = "\n".join([
+    "=" * 70,
+    "PACKET TRACER MARK SCANNER - BATCH PROCESSOR",
+    "=" * 70,
+    "This script will:",
+    "1. 📸 Capture screenshots from PKA files in pka/ directory",
+    "2. 🔍 Extract completion marks from captured images using OCR",
+    "3. 📊 Generate a comprehensive summary report",
+    "4. 💾 Save results to CSV file with timestamp",
+    "-" * 70,
+    "",
+])
+CAPTURE_HEADER = f"\n{'=' * 60}\nSTEP 1: CAPTURING PKA SCREENSHOTS\n{'=' * 60}\n"
+CAPTURE_START = "\n".join([
+    "🚀 Starting PKA capture process...",
+    "📸 This will automatically open PKA files and capture screenshots...",
+    "⏳ Please wait while processing...",
+    "",
+])
+SCAN_HEADER = f"\n{'=' * 60}\nSTEP 2: EXTRACTING MARKS WITH OCR\n{'=' * 60}\n"
+
+# Image suffixes as a tuple, so str.endswith() checks them all in one call
+_EXT_TUPLE = tuple(config.SUPPORTED_IMAGE_FORMATS)
+
+def _write(text):
+    """Write a pre-built block of console output in one call"""
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+def _init_once():
+    """Create output directories and configure logging
+
+    Called from main() rather than at import, so importing this module
+    (e.g. from run.py or a spawned worker process) has no side effects.
+    Skipped when logging has already been configured.
+    """
+    if logging.getLogger().handlers:
+        return
+
+    config.create_directories()
+    log_filename = config.get_log_filename('batch_process')
+    logging.basicConfig(
+        level=getattr(logging, config.LOG_LEVEL),
+        format=config.LOG_FORMAT,
+        handlers=[
+            logging.FileHandler(log_filename, encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
 
 def run_capture_tool():
     """Run the PKA capture tool"""
-    print("\n" + "="*60)
-    print("STEP 1: CAPTURING PKA SCREENSHOTS")
-    print("="*60)
+    _write(CAPTURE_HEADER)
     
     try:
         # Check if capture script exists
-        scripts_dir = Path(__file__).parent
-        capture_script = scripts_dir / 'pka_capture.py'
-        
-        if not capture_script.exists():
+        if not CAPTURE_SCRIPT.exists():
             print("❌ Error: pka_capture.py not found in scripts directory")
             return False
         
         # Run the capture tool
-        print("🚀 Starting PKA capture process...")
-        print("📸 This will automatically open PKA files and capture screenshots...")
-        print("⏳ Please wait while processing...")
-
-        # Run with real-time output
-        process = subprocess.Popen([sys.executable, str(capture_script)],
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT,
-                                 text=True,
-                                 universal_newlines=True)
-
-        # Show real-time output
-        while True:
-            output = process.stdout.readline()
-            if output == '' and process.poll() is not None:
-                break
-            if output:
-                print(f"   {output.strip()}")
-
-        return_code = process.poll()
+        _write(CAPTURE_START)
+
+        # Run in-process; capture logging flows to this script's handlers
+        try:
+            import pka_capture
+            pka_capture.main()
+            return_code = 0
+        except SystemExit as e:
+            return_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
 
         if return_code == 0:
             print("\n✅ PKA capture completed successfully")
-            logging.info("PKA capture completed successfully")
+            _log.info("PKA capture completed successfully")
             return True
         else:
             print(f"\n❌ PKA capture failed with exit code {return_code}")
-            logging.error(f"PKA capture failed with exit code {return_code}")
+            _log.error("PKA capture failed with exit code %s", return_code)
             return False
             
     except Exception as e:
         print(f"❌ Error running capture tool: {e}")
-        logging.error(f"Error running capture tool: {e}")
+        _log.error("Error running capture tool: %s", e)
         return False
 
+def _wait_for_images_stable(path, timeout=2.0, interval=0.1):
+    """Wait until the number of entries in path stops changing
+
+    Returns as soon as two consecutive polls see the same non-zero count,
+    or after timeout seconds.
+    """
+    previous_count = -1
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        try:
+            with os.scandir(path) as entries:
+                current_count = sum(1 for _ in entries)
+        except OSError:
+            current_count = 0
+        if current_count == previous_count and current_count > 0:
+            return
+        previous_count = current_count
+        time.sleep(interval)
+
 def get_student_ids_from_images():
     """Extract student IDs from image filenames"""
-    images_dir = Path(config.IMAGE_DIRECTORY)
-    if not images_dir.exists():
+    images_dir = config.IMAGE_DIRECTORY
+    if not os.path.isdir(images_dir):
         return []
 
     student_ids = set()
-    # Check for all supported image formats
-    for ext in config.SUPPORTED_IMAGE_FORMATS:
-        pattern = f"*{ext}"
-        for image_file in images_dir.glob(pattern):
+    # Single directory pass, filtered on all supported image formats
+    with os.scandir(images_dir) as entries:
+        for entry in entries:
+            name = entry.name
+            if not name.lower().endswith(_EXT_TUPLE) or not entry.is_file():
+                continue
             # Extract ID from filename pattern: ID.extension
-            student_id = image_file.stem
+            student_id = name[:name.rindex('.')]
             # Validate that this looks like a student ID (basic check)
-            if student_id.isdigit() or (student_id.isalnum() and len(student_id) >= 4):
+            if config.is_student_id(student_id):
                 student_ids.add(student_id)
 
-    return sorted(list(student_ids))
+    return sorted(student_ids)
 
 def run_scanner_for_ids(student_ids):
     """Run the OCR scanner for specific student IDs"""
-    print("\n" + "="*60)
-    print("STEP 2: EXTRACTING MARKS WITH OCR")
-    print("="*60)
+    _write(SCAN_HEADER)
     
     if not student_ids:
         print("❌ No student IDs found in images")
@@ -113,10 +162,7 @@ def run_scanner_for_ids(student_ids):
     
     try:
         # Check if scanner script exists
-        scripts_dir = Path(__file__).parent
-        scanner_script = scripts_dir / 'mark_scanner.py'
-        
-        if not scanner_script.exists():
+        if not SCANNER_SCRIPT.exists():
             print("❌ Error: mark_scanner.py not found in scripts directory")
             return False
         
@@ -125,37 +171,38 @@ def run_scanner_for_ids(student_ids):
             print(f"    ... and {len(student_ids) - 5} more")
         
         # Import the scanner module to use its functions
-        sys.path.insert(0, str(scripts_dir))
-        from mark_scanner import scan_id_manual, setup_logging, print_all_results_table
+        from mark_scanner import scan_ids_parallel, setup_logging, print_all_results_table
         
         # Setup logging for the scanner
         setup_logging()
         
-        # Process each student ID
-        all_results = []
-        successful_scans = 0
+        print(f"\n🚀 Starting batch scan of {len(student_ids)} students...\n"
+              f"🔍 Using consensus validation (requires ≥{config.CONSENSUS_MIN_RESULTS} similar PSM results)")
 
-        print(f"\n🚀 Starting batch scan of {len(student_ids)} students...")
-        print(f"🔍 Using consensus validation (requires ≥{config.CONSENSUS_MIN_RESULTS} similar PSM results)")
-
-        for i, student_id in enumerate(student_ids, 1):
-            print(f"\n{'='*60}")
-            print(f"PROCESSING {i}/{len(student_ids)}: {student_id}")
-            print(f"{'='*60}")
+        # Scan student IDs in parallel worker processes, reporting as each chunk finishes
+        all_results = []
+        score_sum = 0
+        positive_count = 0
+        for student_data in scan_ids_parallel(student_ids):
+            all_results.append(student_data)
 
-            # Scan this student ID with detailed logging
-            student_data = scan_id_manual(student_id)
+            # Show brief summary for batch mode
+            score = student_data['Score']
+            if score > 0:
+                score_sum += score
+                positive_count += 1
+            status = "✅ Success" if score > 0 else "⚠️ No score detected"
+            print(f"📊 Result for {student_data['ID Number']}: {score}% - {status}")
 
-            if student_data and student_data['Score'] >= 0:
-                all_results.append(student_data)
-                successful_scans += 1
+        # Restore input order, since workers finish in any order
+        id_order = {student_id: i for i, student_id in enumerate(student_ids)}
+        all_results.sort(key=lambda r: id_order[r['ID Number']])
+        successful_scans = len(all_results)
 
-                # Show brief summary for batch mode
-                score = student_data['Score']
-                status = "✅ Success" if score > 0 else "⚠️ No score detected"
-                print(f"\n📊 Result for {student_id}: {score}% - {status}")
-            else:
-                print(f"\n❌ Failed to process student {student_id}: No image found or processing failed")
+        scanned_ids = {student_data['ID Number'] for student_data in all_results}
+        for student_id in student_ids:
+            if student_id not in scanned_ids:
+                print(f"❌ Failed to process student {student_id}: No image found or processing failed")
 
         # Display comprehensive results table
         if all_results:
@@ -165,22 +212,22 @@ def run_scanner_for_ids(student_ids):
         save_batch_results(all_results)
 
         # Final summary
-        print(f"\n{'='*60}")
-        print("BATCH PROCESSING SUMMARY")
-        print(f"{'='*60}")
-        print(f"📊 Total students: {len(student_ids)}")
-        print(f"✅ Successfully processed: {successful_scans}")
-        print(f"❌ Failed: {len(student_ids) - successful_scans}")
+        print(f"\n{'='*60}\n"
+              "BATCH PROCESSING SUMMARY\n"
+              f"{'='*60}\n"
+              f"📊 Total students: {len(student_ids)}\n"
+              f"✅ Successfully processed: {successful_scans}\n"
+              f"❌ Failed: {len(student_ids) - successful_scans}")
 
         if successful_scans > 0:
-            avg_score = sum(r['Score'] for r in all_results if r['Score'] > 0) / max(successful_scans, 1)
+            avg_score = score_sum / positive_count if positive_count else 0.0
             print(f"📈 Average score: {avg_score:.1f}%")
 
         return True
         
     except Exception as e:
         print(f"❌ Error running scanner: {e}")
-        logging.error(f"Error running scanner: {e}")
+        _log.error("Error running scanner: %s", e)
         return False
 
 def save_batch_results(results):
@@ -200,21 +247,33 @@ def save_batch_results(results):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         csv_filename = results_dir / f"batch_results_{timestamp}.csv"
         
+        fieldnames = ['ID Number', 'Score', 'Final Marks']
+        
+        # Large batches use pandas' C writer when it is installed; pandas is
+        # imported only here so normal runs don't pay its import time
+        pd = None
+        if len(results) >= PANDAS_CSV_MIN_ROWS:
+            try:
+                import pandas as pd
+            except ImportError:
+                pd = None
+        
         # Write CSV file
-        with open(csv_filename, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['ID Number', 'Score', 'Final Marks']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        if pd is not None:
+            pd.DataFrame(results, columns=fieldnames).to_csv(csv_filename, index=False, encoding='utf-8')
+        else:
+            with open(csv_filename, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.writer(csvfile)
 
-            writer.writeheader()
-            for result in results:
-                writer.writerow(result)
+                writer.writerow(fieldnames)
+                writer.writerows((r['ID Number'], r['Score'], r['Final Marks']) for r in results)
         
         print(f"📄 Results saved to: {csv_filename}")
-        logging.info(f"Batch results saved to: {csv_filename}")
+        _log.info("Batch results saved to: %s", csv_filename)
         
     except Exception as e:
         print(f"⚠️  Warning: Could not save results to CSV: {e}")
-        logging.warning(f"Could not save results to CSV: {e}")
+        _log.warning("Could not save results to CSV: %s", e)
 
 def check_prerequisites():
     """Check if all required files and directories exist"""
@@ -223,10 +282,9 @@ def check_prerequisites():
     issues = []
     
     # Check for required scripts
-    scripts_dir = Path(__file__).parent
     required_files = ['config.py', 'pka_capture.py', 'mark_scanner.py']
     for file_name in required_files:
-        file_path = scripts_dir / file_name
+        file_path = SCRIPTS_DIR / file_name
         if not file_path.exists():
             issues.append(f"Missing required script: {file_name}")
     
@@ -263,15 +321,9 @@ def check_prerequisites():
 
 def main():
     """Main batch processing function"""
-    print("=" * 70)
-    print("PACKET TRACER MARK SCANNER - BATCH PROCESSOR")
-    print("=" * 70)
-    print("This script will:")
-    print("1. 📸 Capture screenshots from PKA files in pka/ directory")
-    print("2. 🔍 Extract completion marks from captured images using OCR")
-    print("3. 📊 Generate a comprehensive summary report")
-    print("4. 💾 Save results to CSV file with timestamp")
-    print("-" * 70)
+    _init_once()
+    
+    _write(BATCH_HEADER)
     
     # Check prerequisites
     if not check_prerequisites():
@@ -283,8 +335,8 @@ def main():
         print("\n❌ Batch processing failed at capture stage")
         return False
     
-    # Wait a moment for file system to settle
-    time.sleep(2)
+    # Wait for the file system to settle
+    _wait_for_images_stable(config.IMAGE_DIRECTORY)
     
     # Step 2: Extract student IDs from captured images
     student_ids = get_student_ids_from_images()
@@ -295,18 +347,18 @@ def main():
         return False
     
     # Summary
-    print("\n" + "="*70)
-    print("🎉 BATCH PROCESSING COMPLETED SUCCESSFULLY!")
-    print("="*70)
-    print("✅ All steps completed successfully")
-    print(f"📊 Processed {len(student_ids)} student(s)")
-    print(f"📁 Screenshots saved in: {config.IMAGE_DIRECTORY}/")
-    print("📋 Results saved in: results/ directory (CSV format)")
-    print(f"📝 Detailed logs saved in: {config.LOG_DIRECTORY}/")
-    print("\n🔍 Next steps:")
-    print("   • Review the results CSV file for all student scores")
-    print("   • Check log files if any students failed processing")
-    print("   • Individual images can be re-processed using option 3 if needed")
+    print(f"\n{'='*70}\n"
+          "🎉 BATCH PROCESSING COMPLETED SUCCESSFULLY!\n"
+          f"{'='*70}\n"
+          "✅ All steps completed successfully\n"
+          f"📊 Processed {len(student_ids)} student(s)\n"
+          f"📁 Screenshots saved in: {config.IMAGE_DIRECTORY}/\n"
+          "📋 Results saved in: results/ directory (CSV format)\n"
+          f"📝 Detailed logs saved in: {config.LOG_DIRECTORY}/\n"
+          "\n🔍 Next steps:\n"
+          "   • Review the results CSV file for all student scores\n"
+          "   • Check log files if any students failed processing\n"
+          "   • Individual images can be re-processed using option 3 if needed")
     
     return True
 
@@ -319,5 +371,5 @@ if __name__ == "__main__":
         sys.exit(1)
     except Exception as e:
         print(f"\n❌ Unexpected error: {e}")
-        logging.error(f"Unexpected error in batch processing: {e}")
+        _log.error("Unexpected error in batch processing: %s", e)
         sys.exit(1)
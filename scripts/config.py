@@ -6,9 +6,31 @@ Version: 0.1
 """
 
 import os
+import re
 import sys
+from functools import lru_cache
 from pathlib import Path
 
+try:
+    from functools import cached_property
+except ImportError:  # Python 3.7
+    cached_property = property
+
+# Project root (parent of scripts folder), resolved once at import
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Student ID shape: all ASCII digits, or at least 4 ASCII letters or digits
+_STUDENT_ID_RE = re.compile(r'\d+|[A-Za-z0-9]{4,}', re.ASCII)
+
+@lru_cache(maxsize=None)
+def _first_existing_file(paths):
+    """Return the first of paths that is an existing file, or None
+
+    Installation paths do not change during a run, so each tuple of
+    candidate paths is only checked against the filesystem once.
+    """
+    return next((path for path in paths if os.path.isfile(path)), None)
+
 class Config:
     """Configuration class for the Packet Tracer Mark Scanner"""
     
@@ -30,19 +52,23 @@ class Config:
     @classmethod
     def get_project_root(cls):
         """Get the project root directory (parent of scripts folder)"""
-        return Path(__file__).parent.parent
+        return _PROJECT_ROOT
     
-    @property
+    @cached_property
     def IMAGE_DIRECTORY(self):
-        return str(self.get_project_root() / "images")
+        return self.get_project_root() / "images"
     
-    @property 
+    @cached_property
     def PKA_DIRECTORY(self):
-        return str(self.get_project_root() / "pka")
+        return self.get_project_root() / "pka"
     
-    @property
+    @cached_property
     def LOG_DIRECTORY(self):
-        return str(self.get_project_root() / "logs")
+        return self.get_project_root() / "logs"
+    
+    @cached_property
+    def OCR_CACHE_FILE(self):
+        return self.get_project_root() / ".ocr_cache.json"
     
     # OCR Configuration
     OCR_PSM_CONFIGS = [
@@ -58,13 +84,29 @@ class Config:
     # Consensus validation settings
     CONSENSUS_MIN_RESULTS = 3
     CONSENSUS_TOLERANCE = 2  # ±2% tolerance for grouping results
+    # Stop OCR for an image as soon as one group reaches CONSENSUS_MIN_RESULTS
+    # (False runs the full grid and picks the highest-average group)
+    CONSENSUS_EARLY_STOP = True
+    
+    # Number of images OCR'd together per Tesseract run in batch scans
+    OCR_BATCH_SIZE = 50
+    
+    # Threads for the per-image preprocessing x PSM OCR grid (None = CPU count)
+    OCR_THREADS = None
+    
+    # Maximum number of OCR results kept in the persistent OCR cache
+    OCR_CACHE_SIZE = 4096
+    
+    # Region of the screenshot holding the completion text, as (x, y, width,
+    # height) in pixels; None OCRs the whole image
+    COMPLETION_ROI = None
     
     # Supported file formats
-    SUPPORTED_IMAGE_FORMATS = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
-    SUPPORTED_PKA_FORMATS = ['.pka']
+    SUPPORTED_IMAGE_FORMATS = frozenset({'.jpg', '.jpeg', '.png', '.bmp', '.tiff'})
+    SUPPORTED_PKA_FORMATS = frozenset({'.pka'})
     
     # Attempt types for mark scanning
-    ATTEMPT_TYPES = ['AT1', 'AT2', 'AT3', 'AT4', 'AT5', 'R1']
+    ATTEMPT_TYPES = ('AT1', 'AT2', 'AT3', 'AT4', 'AT5', 'R1')
     
     # Capture configuration
     CAPTURE_ZONE = {
@@ -74,6 +116,10 @@ class Config:
         'height': 600
     }
     
+    # Captures whose most varied sampled row has a standard deviation at or
+    # below this are treated as blank frames
+    CAPTURE_MIN_STDDEV = 2.0
+    
     # Timing configuration (in seconds)
     LAUNCH_WAIT_TIME = 15
     WINDOW_WAIT_TIME = 60
@@ -81,6 +127,10 @@ class Config:
     CAPTURE_DELAY = 0.3
     CLEANUP_DELAY = 2
     
+    # Launch attempts per PKA when no activity window appears; waits
+    # 2s, 4s, ... between attempts
+    LAUNCH_ATTEMPTS = 3
+    
     # Logging configuration
     LOG_LEVEL = "INFO"
     LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
@@ -88,35 +138,30 @@ class Config:
     @classmethod
     def find_tesseract(cls):
         """Find Tesseract OCR installation"""
-        if os.path.exists(cls.TESSERACT_CMD):
-            return cls.TESSERACT_CMD
-        
-        # Try common alternative paths
-        alternative_paths = [
+        # Try the configured path, then common alternative paths
+        candidate_paths = (
+            cls.TESSERACT_CMD,
             r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
             r"C:\Tesseract-OCR\tesseract.exe",
-            "tesseract"  # Try system PATH
-        ]
-        
-        for path in alternative_paths:
-            if os.path.exists(path) or path == "tesseract":
-                return path
+        )
         
-        return None
+        return _first_existing_file(candidate_paths) or "tesseract"  # Try system PATH
     
     @classmethod
     def find_packet_tracer(cls):
         """Find Cisco Packet Tracer installation"""
-        for path in cls.PACKET_TRACER_PATHS:
-            if os.path.exists(path):
-                return path
-        return None
+        return _first_existing_file(tuple(cls.PACKET_TRACER_PATHS))
     
     def create_directories(self):
         """Create necessary directories if they don't exist"""
-        directories = [self.IMAGE_DIRECTORY, self.LOG_DIRECTORY]
-        for directory in directories:
-            os.makedirs(directory, exist_ok=True)
+        for directory in (self.IMAGE_DIRECTORY, self.LOG_DIRECTORY):
+            # Path() keeps plain-string overrides in subclasses working
+            Path(directory).mkdir(parents=True, exist_ok=True)
+    
+    @staticmethod
+    def is_student_id(name):
+        """Check that an image file stem looks like a student ID (basic check)"""
+        return _STUDENT_ID_RE.fullmatch(name) is not None
     
     @classmethod
     def validate_environment(cls):
@@ -139,8 +184,9 @@ class Config:
         
         return issues
     
+    @lru_cache(maxsize=None)
     def get_log_filename(self, tool_name):
-        """Generate log filename with timestamp"""
+        """Generate log filename with timestamp (once per tool per process)"""
         from datetime import datetime
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         return os.path.join(self.LOG_DIRECTORY, f"{tool_name}_{timestamp}.log")
@@ -159,8 +205,13 @@ class ProductionConfig(Config):
 # Default configuration
 DEFAULT_CONFIG = Config
 
+@lru_cache(maxsize=None)
 def get_config():
-    """Get configuration based on environment"""
+    """Get configuration based on environment
+
+    The configuration is built once per process; PKA_ENV is read on the
+    first call only.
+    """
     env = os.getenv('PKA_ENV', 'production').lower()
     
     if env == 'development':
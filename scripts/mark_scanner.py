@@ -7,13 +7,44 @@ Version: 0.1
 """
 
 import os
+import sys
+import atexit
+import contextlib
+import functools
 import cv2
+import hashlib
+import itertools
+import json
+import numpy as np
 import pytesseract
 import re
 import logging
-from pathlib import Path
+import logging.handlers
+import multiprocessing
+import queue
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from config import get_config
 
+# OCR calls run in parallel threads, so keep Tesseract itself single-threaded
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+# tesserocr is optional: when installed, OCR runs in-process through a
+# persistent Tesseract API per thread instead of a tesseract subprocess per call
+try:
+    from tesserocr import PyTessBaseAPI
+except ImportError:
+    PyTessBaseAPI = None
+
+# tqdm is optional: when installed, batch scans show one progress bar
+# instead of printing a line per student
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = None
+
 # Get configuration
 config = get_config()
 
@@ -25,119 +56,479 @@ else:
     print("Warning: Tesseract OCR not found. Please install Tesseract.")
     print("Download from: https://github.com/UB-Mannheim/tesseract/wiki")
 
+# PSM configurations with the page segmentation mode parsed once
+PSM_MODES = [
+    (psm_name, int(re.search(r'--psm\s+(\d+)', psm_config).group(1)), psm_config)
+    for psm_name, psm_config in config.OCR_PSM_CONFIGS
+]
+
+_tess_local = threading.local()
+_tess_api_failed = False
+_ocr_executor = None
+_log_listener = None
+
+def _get_tess_api():
+    """Return this thread's tesserocr API, or None to use pytesseract"""
+    global _tess_api_failed
+
+    if PyTessBaseAPI is None or _tess_api_failed:
+        return None
+
+    api = getattr(_tess_local, 'api', None)
+    if api is None:
+        # Use the tessdata folder of the configured Tesseract install, if any
+        tessdata_dir = os.path.join(os.path.dirname(tesseract_path), 'tessdata')
+        try:
+            if os.path.isfile(tesseract_path) and os.path.isdir(tessdata_dir):
+                api = PyTessBaseAPI(path=tessdata_dir, lang='eng')
+            else:
+                api = PyTessBaseAPI(lang='eng')
+        except RuntimeError as e:
+            logging.warning(f"Could not initialize tesserocr, falling back to pytesseract: {e}")
+            _tess_api_failed = True
+            return None
+        atexit.register(api.End)
+        _tess_local.api = api
+
+    return api
+
+def _get_ocr_executor():
+    """Return the long-lived thread pool for the OCR grid
+
+    The pool is kept for the whole run so each worker thread's Tesseract
+    API is initialized once, not once per image.
+    """
+    global _ocr_executor
+
+    if _ocr_executor is None:
+        _ocr_executor = ThreadPoolExecutor(max_workers=config.OCR_THREADS or os.cpu_count(),
+                                           thread_name_prefix='ocr')
+    return _ocr_executor
+
+def ocr_image(img, psm, psm_config):
+    """Extract text from a preprocessed image with the given page segmentation mode"""
+    api = _get_tess_api()
+    if api is not None:
+        # Hand Tesseract the 8-bit grayscale buffer directly instead of a PIL image
+        img = np.ascontiguousarray(img)
+        api.SetPageSegMode(psm)
+        api.SetImageBytes(img.tobytes(), img.shape[1], img.shape[0], 1, img.strides[0])
+        return api.GetUTF8Text()
+
+    return pytesseract.image_to_string(img, config=psm_config)
+
+# OCR text cache keyed by preprocessed-image hash and PSM config, kept in
+# least-recently-used order and persisted to config.OCR_CACHE_FILE
+_ocr_cache = None
+_ocr_cache_dirty = False
+_ocr_cache_new = {}
+_ocr_cache_lock = threading.Lock()
+
+def image_hash(img):
+    """SHA-256 of a preprocessed image's shape and pixels, used as OCR cache key"""
+    digest = hashlib.sha256(repr(img.shape).encode())
+    digest.update(img.tobytes())
+    return digest.hexdigest()
+
+def _load_ocr_cache():
+    """Load the persisted OCR cache on first use (call with the lock held)"""
+    global _ocr_cache
+
+    if _ocr_cache is None:
+        _ocr_cache = OrderedDict()
+        try:
+            with open(config.OCR_CACHE_FILE, 'r', encoding='utf-8') as cache_file:
+                _ocr_cache.update(json.load(cache_file))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable OCR cache {config.OCR_CACHE_FILE}: {e}")
+        atexit.register(save_ocr_cache)
+
+    return _ocr_cache
+
+def _get_cached_text(key):
+    """Return cached OCR text for key, or None"""
+    with _ocr_cache_lock:
+        cache = _load_ocr_cache()
+        text = cache.get(key)
+        if text is not None:
+            cache.move_to_end(key)
+        return text
+
+def _put_cached_text(key, text):
+    """Store OCR text, evicting the least recently used entries"""
+    global _ocr_cache_dirty
+
+    with _ocr_cache_lock:
+        cache = _load_ocr_cache()
+        cache[key] = text
+        cache.move_to_end(key)
+        while len(cache) > config.OCR_CACHE_SIZE:
+            cache.popitem(last=False)
+        _ocr_cache_new[key] = text
+        _ocr_cache_dirty = True
+
+def take_new_cache_entries():
+    """Return the entries cached since the last call and mark them saved
+
+    Worker processes hand these back to the parent, which merges them and
+    writes the cache file once instead of each worker overwriting it.
+    """
+    global _ocr_cache_dirty
+
+    with _ocr_cache_lock:
+        entries = dict(_ocr_cache_new)
+        _ocr_cache_new.clear()
+        _ocr_cache_dirty = False
+        return entries
+
+def merge_ocr_cache(entries):
+    """Add entries returned by a worker process to this process's cache"""
+    for key, text in entries.items():
+        _put_cached_text(key, text)
+
+def save_ocr_cache():
+    """Write the OCR cache to disk if it changed"""
+    global _ocr_cache_dirty
+
+    with _ocr_cache_lock:
+        if _ocr_cache is None or not _ocr_cache_dirty:
+            return
+        try:
+            temp_path = f"{config.OCR_CACHE_FILE}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as cache_file:
+                json.dump(_ocr_cache, cache_file)
+            os.replace(temp_path, config.OCR_CACHE_FILE)
+            _ocr_cache_new.clear()
+            _ocr_cache_dirty = False
+        except OSError as e:
+            logging.warning(f"Could not save OCR cache: {e}")
+
+def ocr_image_cached(img, img_hash, psm, psm_config):
+    """OCR a preprocessed image, reusing the cached text for identical images"""
+    key = f"{img_hash}:{psm_config}"
+    text = _get_cached_text(key)
+    if text is None:
+        text = ocr_image(img, psm, psm_config)
+        _put_cached_text(key, text)
+    return text
+
+def _stop_log_listener():
+    """Write out queued log records and close the listener's handlers"""
+    global _log_listener
+
+    if _log_listener is not None:
+        listener, _log_listener = _log_listener, None
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+class _ListenerQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that also stops the log listener when it is closed"""
+
+    def close(self):
+        _stop_log_listener()
+        super().close()
+
 def setup_logging():
-    """Setup logging configuration"""
+    """Setup logging configuration
+
+    Records go through a QueueHandler so OCR threads never wait on the file
+    or console; a background QueueListener does the actual writes.
+    """
+    global _log_listener
+
     config.create_directories()
     log_filename = config.get_log_filename('mark_scanner')
-    
-    logging.basicConfig(
-        level=getattr(logging, config.LOG_LEVEL),
-        format=config.LOG_FORMAT,
-        handlers=[
-            logging.FileHandler(log_filename, encoding='utf-8'),
-            logging.StreamHandler()
-        ]
-    )
-    
+
+    root_logger = logging.getLogger()
+    if root_logger.handlers:
+        return log_filename
+
+    formatter = logging.Formatter(config.LOG_FORMAT)
+    handlers = [
+        logging.FileHandler(log_filename, encoding='utf-8'),
+        logging.StreamHandler()
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(-1)
+    _log_listener = logging.handlers.QueueListener(log_queue, *handlers)
+    _log_listener.start()
+    atexit.register(_stop_log_listener)
+
+    root_logger.addHandler(_ListenerQueueHandler(log_queue))
+    root_logger.setLevel(getattr(logging, config.LOG_LEVEL))
+
     return log_filename
 
+# Multiple preprocessing methods applied to the grayscale image before OCR.
+# Each takes (gray, out) and writes its result into the uint8 buffer out,
+# which has the same shape as gray, and returns it.
+# CLAHE objects are built once instead of on every image; preprocessing runs
+# on the calling thread only, so sharing them is safe
+_CLAHE_STD = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
+_CLAHE_ENH = cv2.createCLAHE(clipLimit=5.0, tileGridSize=(16,16))
+
+def _bilateral_otsu(img, out):
+    """Bilateral filter into out, then OTSU threshold out in place"""
+    cv2.bilateralFilter(img, 9, 75, 75, dst=out)
+    cv2.threshold(out, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=out)
+    return out
+
+PREPROCESSING_METHODS = [
+    ("Original", lambda img, out: cv2.convertScaleAbs(img, dst=out, alpha=1.2, beta=10)),
+    ("CLAHE", lambda img, out: _CLAHE_STD.apply(img, dst=out)),
+    ("High Contrast", lambda img, out: cv2.convertScaleAbs(img, dst=out, alpha=2.0, beta=30)),
+    ("Enhanced CLAHE", lambda img, out: _CLAHE_ENH.apply(img, dst=out)),
+    ("Bilateral+OTSU", _bilateral_otsu)
+]
+
+# Completion percentage patterns, most specific first. Labelled matches -
+# "Completion: XX%", "Score: XX%", "Progress: XX%" and "XX% complete(d)" -
+# take precedence; any bare "XX%" is only used when none of them is found
+STRONG_COMPLETION_RE = re.compile(
+    r'(?:completion|score|progress)[:\s]*(\d{1,3})%|(\d{1,3})%\s*complete',
+    re.IGNORECASE
+)
+FALLBACK_COMPLETION_RE = re.compile(r'(\d{1,3})%')
+
+def parse_completion_percentage(text):
+    """Return the highest completion percentage (0-100) found in OCR text, or 0"""
+    # Every pattern needs a '%', so blank or unreadable OCR output skips the regex
+    if '%' not in text:
+        return 0
+
+    found_percentages = [int(labelled or trailing)
+                         for labelled, trailing in STRONG_COMPLETION_RE.findall(text)]
+    found_percentages = [p for p in found_percentages if p <= 100]
+    if not found_percentages:
+        found_percentages = [p for p in map(int, FALLBACK_COMPLETION_RE.findall(text)) if p <= 100]
+
+    return max(found_percentages) if found_percentages else 0
+
 def extract_completion_percentage_multi_psm(image_path):
     """Extract completion percentage using multiple PSM modes with consensus validation"""
     try:
         logging.info(f"Processing image: {os.path.basename(image_path)}")
 
-        # Read image
-        image = cv2.imread(image_path)
-        if image is None:
+        # Read image as grayscale (cached across re-scans of the same file)
+        gray = _load_gray(image_path)
+        if gray is None:
             logging.error(f"Could not read image: {image_path}")
             return 0, "Image read failed"
 
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return _extract_from_gray(gray, image_path)
 
-        # Multiple preprocessing methods
-        preprocessing_methods = [
-            ("Original", lambda img: cv2.convertScaleAbs(img, alpha=1.2, beta=10)),
-            ("CLAHE", lambda img: cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8)).apply(img)),
-            ("High Contrast", lambda img: cv2.convertScaleAbs(img, alpha=2.0, beta=30)),
-            ("Enhanced CLAHE", lambda img: cv2.createCLAHE(clipLimit=5.0, tileGridSize=(16,16)).apply(img)),
-            ("Bilateral+OTSU", lambda img: cv2.threshold(cv2.bilateralFilter(img, 9, 75, 75), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1])
-        ]
-
-        # Use configured PSM configurations for consensus validation
-        psm_configs = config.OCR_PSM_CONFIGS
-
-        # Store all results for consensus analysis
-        all_psm_results = []
+    except Exception as e:
+        logging.error(f"Error extracting percentage from {image_path}: {e}")
+        return 0, f"Error: {str(e)}"
 
-        # Try each preprocessing method with each PSM config
-        for method_name, preprocess_func in preprocessing_methods:
-            try:
-                processed_img = preprocess_func(gray)
+def _read_gray(image_path):
+    """Decode an image file to grayscale, or None if it cannot be read"""
+    # Decoding straight to one channel skips the BGR buffer and cvtColor pass
+    return cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
 
-                # Test all PSM modes with this preprocessing
-                psm_results = []
+def _load_gray(image_path):
+    """Grayscale image for image_path, reused until the file is modified"""
+    try:
+        mtime_ns = os.stat(image_path).st_mtime_ns
+    except OSError:
+        return None
+    return _load_gray_cached(image_path, mtime_ns)
+
+@functools.lru_cache(maxsize=64)
+def _load_gray_cached(image_path, mtime_ns):
+    """Decode once per (path, mtime); the shared array is made read-only"""
+    gray = _read_gray(image_path)
+    if gray is not None:
+        gray.flags.writeable = False
+    return gray
+
+def _crop_to_roi(gray):
+    """Crop a grayscale screenshot to config.COMPLETION_ROI when one is set"""
+    if not config.COMPLETION_ROI:
+        return gray
+
+    x, y, w, h = config.COMPLETION_ROI
+    cropped = gray[y:y + h, x:x + w]
+    if cropped.size == 0:
+        logging.warning(f"COMPLETION_ROI {config.COMPLETION_ROI} is outside the "
+                        f"{gray.shape[1]}x{gray.shape[0]} image, using the whole image")
+        return gray
+    return cropped
+
+def _extract_from_gray(gray, image_path):
+    """Run the preprocessing x PSM grid on a grayscale image with consensus validation"""
+    try:
+        # Only OCR the region holding the completion text
+        gray = _crop_to_roi(gray)
 
-                for psm_name, psm_config in psm_configs:
-                    try:
-                        # Extract text using current config
-                        text = pytesseract.image_to_string(processed_img, config=psm_config)
-
-                        # Comprehensive completion percentage patterns
-                        completion_patterns = [
-                            r'Completion[:\s]*(\d{1,3})%',        # Completion: XX%
-                            r'completion[:\s]*(\d{1,3})%',        # completion: XX%
-                            r'(\d{1,3})%\s*[Cc]omplete',         # XX% complete
-                            r'(\d{1,3})%\s*[Cc]ompleted',        # XX% completed
-                            r'(\d{1,3})%',                       # Any XX%
-                            r'Score[:\s]*(\d{1,3})%',            # Score: XX%
-                            r'Progress[:\s]*(\d{1,3})%',         # Progress: XX%
-                        ]
-
-                        found_percentages = []
-                        for pattern in completion_patterns:
-                            matches = re.findall(pattern, text, re.IGNORECASE)
-                            if matches:
-                                for match in matches:
-                                    try:
-                                        percentage = int(match)
-                                        if 0 <= percentage <= 100:
-                                            found_percentages.append(percentage)
-                                    except ValueError:
-                                        continue
-
-                        if found_percentages:
-                            max_percentage = max(found_percentages)
-                            psm_results.append((psm_name, max_percentage))
-                            logging.info(f"PSM {psm_name} with {method_name}: {max_percentage}%")
-                        else:
-                            psm_results.append((psm_name, 0))
+        # Each method's PSM modes are OCR'd in parallel on the thread pool
+        key = os.path.basename(image_path)
+        return _grid_consensus([(key, image_path, gray)], _ocr_images_each,
+                               _get_ocr_executor())[key]
 
-                    except Exception as e:
-                        logging.warning(f"PSM config {psm_name} with {method_name} failed: {e}")
-                        psm_results.append((psm_name, 0))
-                        continue
+    except Exception as e:
+        logging.error(f"Error extracting percentage from {image_path}: {e}")
+        return 0, f"Error: {str(e)}"
 
-                # Store results for this preprocessing method
-                all_psm_results.append((method_name, psm_results))
+def _ocr_images_each(images, image_hashes, psm, psm_config):
+    """OCR several images one at a time, one text per image, reusing cached texts"""
+    return [ocr_image_cached(img, img_hash, psm, psm_config)
+            for img, img_hash in zip(images, image_hashes)]
+
+def _grid_consensus(grays, ocr_images, executor=None):
+    """Run the preprocessing x PSM grid over (key, image path, gray) entries
+
+    ocr_images(images, image_hashes, psm, psm_config) returns one OCR text
+    per image. Votes are counted method by method in PREPROCESSING_METHODS
+    order; a method whose output is pixel-identical to an earlier one's
+    reuses its results, and with CONSENSUS_EARLY_STOP an image leaves the
+    grid once a consensus group forms. Without an executor the PSM modes
+    run in turn, each covering every image still without a consensus; with
+    one, each method's PSM modes run in parallel and the queued ones are
+    cancelled once every image has a consensus.
+    Returns {key: (percentage, consensus_info)}.
+    """
+    early_results = {}
+    # Methods run one at a time, so each image needs a single output
+    # buffer, overwritten by the next method
+    buffers = {key: np.empty_like(gray) for key, _, gray in grays}
+    all_psm_results = {key: [] for key, _, _ in grays}
+    consensus_groups = {key: [] for key, _, _ in grays}
+    # PSM results per image keyed by preprocessed-image hash
+    psm_results_by_hash = {key: {} for key, _, _ in grays}
+
+    def count_vote(key, percentage):
+        if config.CONSENSUS_EARLY_STOP and percentage and key not in early_results:
+            group = _add_to_consensus_group(consensus_groups[key], percentage)
+            if group:
+                early_results[key] = _early_consensus(group)
+
+    def ocr_mode(batch, method_name, psm_mode):
+        psm_name, psm, psm_config = psm_mode
+        try:
+            return ocr_images([img for _, img, _, _ in batch],
+                              [img_hash for _, _, img_hash, _ in batch],
+                              psm, psm_config)
+        except Exception as e:
+            logging.warning(f"PSM config {psm_name} with {method_name} failed: {e}")
+            return [''] * len(batch)
+
+    def mode_texts(batch, method_name):
+        """Yield (psm_name, batch entries, texts) for each PSM mode in order"""
+        if executor is None:
+            for psm_mode in PSM_MODES:
+                batch = [entry for entry in batch if entry[0] not in early_results]
+                if not batch:
+                    return
+                yield psm_mode[0], batch, ocr_mode(batch, method_name, psm_mode)
+        else:
+            mode_results = executor.map(lambda psm_mode: ocr_mode(batch, method_name, psm_mode),
+                                        PSM_MODES)
+            try:
+                for (psm_name, _, _), texts in zip(PSM_MODES, mode_results):
+                    yield psm_name, batch, texts
+                    if all(entry[0] in early_results for entry in batch):
+                        return
+            finally:
+                mode_results.close()
 
+    for method_name, preprocess_func in PREPROCESSING_METHODS:
+        batch = []
+        for key, image_path, gray in grays:
+            if key in early_results:
+                continue
+            try:
+                processed_img = preprocess_func(gray, buffers[key])
             except Exception as e:
-                logging.warning(f"Preprocessing method {method_name} failed: {e}")
+                logging.warning(f"Preprocessing method {method_name} failed for {image_path}: {e}")
                 continue
 
-        # Analyze consensus across PSM modes
-        consensus_result, consensus_info = analyze_psm_consensus(all_psm_results)
+            img_hash = image_hash(processed_img)
+            psm_results = psm_results_by_hash[key].get(img_hash)
+            if psm_results is not None:
+                logging.info(f"{key}: {method_name} output matches an earlier method, reusing its results")
+                all_psm_results[key].append((method_name, list(psm_results)))
+                for _, percentage in psm_results:
+                    count_vote(key, percentage)
+            else:
+                psm_results = psm_results_by_hash[key][img_hash] = []
+                all_psm_results[key].append((method_name, psm_results))
+                batch.append((key, processed_img, img_hash, psm_results))
 
-        if consensus_result > 0:
-            logging.info(f"Consensus result: {consensus_result}% - {consensus_info}")
-            return consensus_result, consensus_info
-        else:
-            logging.warning(f"No consensus found across PSM modes for {image_path}")
-            return 0, "No consensus across PSM modes"
+        if not batch:
+            continue
 
-    except Exception as e:
-        logging.error(f"Error extracting percentage from {image_path}: {e}")
-        return 0, f"Error: {str(e)}"
+        for psm_name, entries, texts in mode_texts(batch, method_name):
+            for (key, _, _, psm_results), text in zip(entries, texts):
+                if key in early_results:
+                    continue
+                max_percentage = parse_completion_percentage(text)
+                psm_results.append((psm_name, max_percentage))
+                if max_percentage:
+                    logging.info(f"{key}: PSM {psm_name} with {method_name}: {max_percentage}%")
+                    count_vote(key, max_percentage)
+
+    results = {}
+    for key, image_path, _ in grays:
+        if key in early_results:
+            results[key] = early_results[key]
+            logging.info(f"Consensus result: {results[key][0]}% - {results[key][1]}")
+        else:
+            results[key] = _consensus_for_image(all_psm_results[key], image_path)
+    return results
+
+def group_similar_percentages(percentages):
+    """Group indices of similar percentages, each group spanning at most the tolerance
+
+    Values are walked in ascending order and a new group starts whenever a
+    value is more than CONSENSUS_TOLERANCE above the group's smallest value.
+    Each image has at most one vote per grid cell, so a plain list walk is
+    cheaper here than building numpy arrays.
+    """
+    groups = []
+    for i in sorted(range(len(percentages)), key=percentages.__getitem__):
+        if groups and percentages[i] - percentages[groups[-1][0]] <= config.CONSENSUS_TOLERANCE:
+            groups[-1].append(i)
+        else:
+            groups.append([i])
+    return groups
+
+def _add_to_consensus_group(seen_percentages, percentage):
+    """Record a percentage and regroup everything seen so far for this image
+
+    Returns the values of the highest-average group once one holds
+    CONSENSUS_MIN_RESULTS values, else None.
+    """
+    seen_percentages.append(percentage)
+    valid_groups = [[seen_percentages[i] for i in group]
+                    for group in group_similar_percentages(seen_percentages)
+                    if len(group) >= config.CONSENSUS_MIN_RESULTS]
+    if not valid_groups:
+        return None
+    return max(valid_groups, key=lambda values: sum(values) / len(values))
+
+def _early_consensus(group_values):
+    """Final percentage and consensus info for a group that stopped the grid early"""
+    avg_percentage = sum(group_values) / len(group_values)
+    final_percentage = round(avg_percentage)
+    return final_percentage, (f"Consensus from {len(group_values)} PSM modes "
+                              f"(avg: {avg_percentage:.1f}% → {final_percentage}%, stopped early)")
+
+def _consensus_for_image(all_psm_results, image_path):
+    """Analyze consensus across PSM modes for one image"""
+    consensus_result, consensus_info = analyze_psm_consensus(all_psm_results)
+
+    if consensus_result > 0:
+        logging.info(f"Consensus result: {consensus_result}% - {consensus_info}")
+        return consensus_result, consensus_info
+    else:
+        logging.warning(f"No consensus found across PSM modes for {image_path}")
+        return 0, "No consensus across PSM modes"
 
 def analyze_psm_consensus(all_psm_results):
     """Analyze PSM results to find consensus (at least 3 similar results)"""
@@ -153,31 +544,21 @@ def analyze_psm_consensus(all_psm_results):
         if len(all_percentages) < config.CONSENSUS_MIN_RESULTS:
             return 0, f"Insufficient results ({len(all_percentages)} < {config.CONSENSUS_MIN_RESULTS})"
 
-        # Group similar percentages (within configured tolerance)
-        percentage_groups = {}
-
-        for percentage, method_info in all_percentages:
-            # Find if this percentage belongs to an existing group
-            group_found = False
-            for group_key in percentage_groups:
-                if abs(percentage - group_key) <= config.CONSENSUS_TOLERANCE:
-                    percentage_groups[group_key].append((percentage, method_info))
-                    group_found = True
-                    break
-
-            if not group_found:
-                percentage_groups[percentage] = [(percentage, method_info)]
+        # Group similar percentages, each group spanning at most the tolerance
+        percentages = [p for p, _ in all_percentages]
+        groups = group_similar_percentages(percentages)
 
         # Find groups with at least 3 similar results
         valid_groups = []
-        for group_key, group_values in percentage_groups.items():
-            if len(group_values) >= config.CONSENSUS_MIN_RESULTS:
+        for group in groups:
+            if len(group) >= config.CONSENSUS_MIN_RESULTS:
                 # Calculate average of the group
-                avg_percentage = sum(p for p, _ in group_values) / len(group_values)
+                avg_percentage = sum(percentages[i] for i in group) / len(group)
+                group_values = [all_percentages[i] for i in group]
                 valid_groups.append((avg_percentage, len(group_values), group_values))
 
         if not valid_groups:
-            return 0, f"No consensus: largest group has {max(len(v) for v in percentage_groups.values())} results (need ≥{config.CONSENSUS_MIN_RESULTS})"
+            return 0, f"No consensus: largest group has {max(len(g) for g in groups)} results (need ≥{config.CONSENSUS_MIN_RESULTS})"
 
         # Select the group with highest average percentage
         best_group = max(valid_groups, key=lambda x: x[0])
@@ -211,17 +592,52 @@ def find_images_for_id(id_number, image_directory=None):
         return found_images
 
     # Look for images with pattern: ID.extension
-    image_extensions = config.SUPPORTED_IMAGE_FORMATS
+    image_path = _get_image_index(image_directory).get(_image_key(str(id_number)))
+    if image_path:
+        found_images['MAIN'] = image_path
 
-    for ext in image_extensions:
-        image_filename = f"{id_number}{ext}"
-        image_path = os.path.join(image_directory, image_filename)
+    return found_images
 
-        if os.path.exists(image_path):
-            found_images['MAIN'] = image_path
-            break
+def _image_key(stem):
+    """Index key for a file stem, case-insensitive where the filesystem is (Windows)"""
+    return stem.casefold() if os.name == 'nt' else stem
+
+def _image_stem(image_path):
+    """File name of an indexed image without its extension"""
+    return os.path.basename(image_path).rpartition('.')[0]
+
+def _get_image_index(image_directory):
+    """Return {_image_key(stem): path} for the directory's images, rebuilt when it changes"""
+    image_directory = os.fspath(image_directory)
+    return _index_image_dir(image_directory, os.stat(image_directory).st_mtime_ns)
+
+@functools.lru_cache(maxsize=4)
+def _index_image_dir(directory, mtime_ns):
+    """Index image files by stem with a single scandir pass
+
+    mtime_ns is part of the cache key so files added or removed since the
+    last scan are picked up. Stems are keyed with _image_key, so on Windows
+    lookups ignore case as the old os.path.exists() checks did. When one ID
+    has several extensions, the first in sorted extension order wins, as
+    with the old per-extension lookup.
+    """
+    image_extensions = sorted(config.SUPPORTED_IMAGE_FORMATS)
+    ext_rank = {ext: rank for rank, ext in enumerate(image_extensions)}
+
+    index = {}
+    ranks = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            stem, dot, ext = entry.name.rpartition('.')
+            rank = ext_rank.get(dot + ext.lower())
+            if not stem or rank is None or not entry.is_file():
+                continue
+            key = _image_key(stem)
+            if key not in ranks or rank < ranks[key]:
+                index[key] = entry.path
+                ranks[key] = rank
 
-    return found_images
+    return index
 
 def scan_id_manual(id_number, image_directory=None):
     """Scan image for a specific ID number manually with PSM consensus"""
@@ -267,6 +683,163 @@ def scan_id_manual(id_number, image_directory=None):
 
     return student_data
 
+def _ocr_images_batch(images, image_hashes, psm, psm_config):
+    """OCR several images, one text per image, reusing cached texts
+
+    Images missing from the OCR cache are handed to _ocr_images_uncached.
+    """
+    keys = [f"{img_hash}:{psm_config}" for img_hash in image_hashes]
+    texts = [_get_cached_text(key) for key in keys]
+
+    misses = [i for i, text in enumerate(texts) if text is None]
+    if misses:
+        miss_texts = _ocr_images_uncached([images[i] for i in misses], psm, psm_config)
+        for i, text in zip(misses, miss_texts):
+            texts[i] = text
+            _put_cached_text(keys[i], text)
+
+    return texts
+
+def _ocr_images_uncached(images, psm, psm_config):
+    """OCR several images with a single Tesseract process, one text per image
+
+    Tesseract accepts a text file listing image paths and writes the pages
+    separated by form feeds, so its startup and language data load are paid
+    once for the whole list instead of once per image. With tesserocr the
+    persistent API already avoids that cost, so images are OCR'd in turn.
+    """
+    if _get_tess_api() is not None:
+        return [ocr_image(img, psm, psm_config) for img in images]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        image_paths = []
+        for index, img in enumerate(images):
+            image_path = os.path.join(temp_dir, f"{index}.png")
+            cv2.imwrite(image_path, img)
+            image_paths.append(image_path)
+
+        list_path = os.path.join(temp_dir, "images.txt")
+        with open(list_path, 'w', encoding='utf-8') as list_file:
+            list_file.write("\n".join(image_paths) + "\n")
+
+        text = pytesseract.image_to_string(list_path, config=psm_config)
+
+    pages = text.split('\f')
+    if len(pages) > len(images) and not pages[-1].strip():
+        pages = pages[:-1]
+
+    if len(pages) != len(images):
+        logging.warning(f"Batch OCR returned {len(pages)} pages for {len(images)} images, "
+                        f"falling back to one Tesseract run per image")
+        return [pytesseract.image_to_string(img, config=psm_config) for img in images]
+
+    return pages
+
+def _scan_chunk(id_images):
+    """Run the preprocessing x PSM grid over a chunk of (ID, image path) pairs"""
+    results = {}
+    grays = []
+
+    for id_number, image_path in id_images:
+        logging.info(f"Processing image: {os.path.basename(image_path)}")
+        gray = _read_gray(image_path)
+        if gray is None:
+            logging.error(f"Could not read image: {image_path}")
+            results[id_number] = 0
+            continue
+        grays.append((id_number, image_path, _crop_to_roi(gray)))
+
+    # One Tesseract run per PSM mode covers every image still without a consensus
+    for id_number, (score, _) in _grid_consensus(grays, _ocr_images_batch).items():
+        results[id_number] = score
+
+    return results
+
+def scan_ids_batch(student_ids, image_directory=None):
+    """Scan several student IDs at once with PSM consensus
+
+    Images are loaded and preprocessed once, then each preprocessing and
+    PSM combination is OCR'd across the whole chunk in one Tesseract run.
+    Returns one student record per ID that has an image, in input order.
+    """
+    if image_directory is None:
+        image_directory = config.IMAGE_DIRECTORY
+
+    id_images = []
+    for id_number in student_ids:
+        found_images = find_images_for_id(id_number, image_directory)
+        if found_images:
+            id_images.append((id_number, found_images['MAIN']))
+        else:
+            logging.warning(f"No image found for ID {id_number}")
+
+    scores = {}
+    batch_size = config.OCR_BATCH_SIZE
+    for start in range(0, len(id_images), batch_size):
+        scores.update(_scan_chunk(id_images[start:start + batch_size]))
+
+    return [
+        {'ID Number': id_number, 'Score': scores[id_number], 'Final Marks': scores[id_number]}
+        for id_number, _ in id_images
+    ]
+
+def _scan_ids_task(student_ids, image_directory):
+    """Worker-side scan_ids_batch that also returns the new OCR cache entries"""
+    records = scan_ids_batch(student_ids, image_directory)
+    # Taking the entries clears the dirty flag, so the worker's atexit save
+    # is a no-op and only the parent writes the cache file
+    return records, take_new_cache_entries()
+
+def init_worker_logging(log_queue):
+    """Route a worker process's log records to the parent process"""
+    root_logger = logging.getLogger()
+    root_logger.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    root_logger.setLevel(getattr(logging, config.LOG_LEVEL))
+
+def scan_ids_parallel(student_ids, image_directory=None, max_workers=None):
+    """Scan student IDs across a pool of worker processes
+
+    The IDs are split into chunks of at most OCR_BATCH_SIZE, small enough
+    that every worker gets several, and each chunk is scanned with
+    scan_ids_batch. Student records are yielded as each chunk finishes, so
+    progress arrives steadily and idle workers pick up the remaining chunks. Worker log
+    records are forwarded to the handlers configured in this process, and
+    the OCR cache entries workers add are merged and saved here once.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    workers = max(min(len(student_ids), max_workers), 1)
+
+    if workers == 1:
+        try:
+            yield from scan_ids_batch(student_ids, image_directory)
+        finally:
+            save_ocr_cache()
+        return
+
+    # Spawn matches the Windows default and avoids changing the global start method
+    mp_context = multiprocessing.get_context('spawn')
+    log_queue = mp_context.Queue()
+    listener = logging.handlers.QueueListener(log_queue, *logging.getLogger().handlers,
+                                              respect_handler_level=True)
+    listener.start()
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context,
+                                 initializer=init_worker_logging,
+                                 initargs=(log_queue,)) as executor:
+            chunk_size = max(1, min(config.OCR_BATCH_SIZE, len(student_ids) // (workers * 4)))
+            futures = [executor.submit(_scan_ids_task, student_ids[start:start + chunk_size],
+                                       image_directory)
+                       for start in range(0, len(student_ids), chunk_size)]
+            for future in as_completed(futures):
+                records, cache_entries = future.result()
+                merge_ocr_cache(cache_entries)
+                yield from records
+    finally:
+        listener.stop()
+        save_ocr_cache()
+
 def print_results_table(student_data):
     """Print results in table format"""
     if student_data is None:
@@ -302,20 +875,46 @@ def get_all_student_ids_from_images(image_directory=None):
     if not os.path.exists(image_directory):
         return []
 
-    student_ids = set()
-    image_extensions = config.SUPPORTED_IMAGE_FORMATS
+    # Extract IDs from filename pattern: ID.extension, keeping names that
+    # look like a student ID
+    return sorted(
+        student_id for student_id in map(_image_stem, _get_image_index(image_directory).values())
+        if config.is_student_id(student_id)
+    )
+
+class _TqdmStream:
+    """File-like wrapper that writes through tqdm.write so progress bars are redrawn"""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, text):
+        tqdm.write(text, file=self._stream, end='')
+
+    def flush(self):
+        self._stream.flush()
 
-    # Scan all image files in the directory
-    for ext in image_extensions:
-        pattern = f"*{ext}"
-        for image_file in Path(image_directory).glob(pattern):
-            # Extract ID from filename pattern: ID.extension
-            student_id = image_file.stem
-            # Validate that this looks like a student ID (basic check)
-            if student_id.isdigit() or (student_id.isalnum() and len(student_id) >= 4):
-                student_ids.add(student_id)
+@contextlib.contextmanager
+def _console_logs_via_tqdm():
+    """Route console log handlers through tqdm.write while a progress bar is shown
 
-    return sorted(list(student_ids))
+    The console handler may sit behind the QueueListener set up by
+    setup_logging rather than on the root logger, so both are checked.
+    """
+    handlers = list(logging.getLogger().handlers)
+    if _log_listener is not None:
+        handlers.extend(_log_listener.handlers)
+
+    console_handlers = [(handler, handler.stream) for handler in handlers
+                        if type(handler) is logging.StreamHandler
+                        and handler.stream in (sys.stdout, sys.stderr)]
+    for handler, stream in console_handlers:
+        handler.setStream(_TqdmStream(stream))
+    try:
+        yield
+    finally:
+        for handler, stream in console_handlers:
+            handler.setStream(stream)
 
 def scan_all_students(image_directory=None):
     """Scan all student IDs found in the image directory"""
@@ -349,32 +948,43 @@ def scan_all_students(image_directory=None):
     print(f"\n🚀 Starting batch scan of {len(student_ids)} students...")
     print(f"🔍 Using consensus validation (requires ≥{config.CONSENSUS_MIN_RESULTS} similar PSM results)")
 
+    # Students are scanned across worker processes and reported as each
+    # worker finishes; rows are appended to the CSV as they arrive so a
+    # long scan is saved incrementally, then put back into directory order
+    results_csv = _ResultsCSV()
+    progress = tqdm(total=len(student_ids), desc="OCR", unit="student") if tqdm else None
     all_results = []
-    successful_scans = 0
-
-    for i, student_id in enumerate(student_ids, 1):
-        print(f"\n{'='*40}")
-        print(f"Processing {i}/{len(student_ids)}: {student_id}")
-        print(f"{'='*40}")
-
-        # Scan this student
-        student_data = scan_id_manual(student_id, image_directory)
-
-        if student_data:
-            all_results.append(student_data)
-            successful_scans += 1
-
-            # Show brief results
-            score = student_data['Score']
-            print(f"✅ {student_id}: Score: {score}%")
-        else:
+    # Log lines go through tqdm.write while the bar is up, so they print
+    # above it instead of breaking it apart
+    console_logs = _console_logs_via_tqdm() if progress else contextlib.nullcontext()
+    try:
+        with console_logs:
+            for i, student_data in enumerate(scan_ids_parallel(student_ids, image_directory), 1):
+                all_results.append(student_data)
+                if progress:
+                    progress.update()
+                else:
+                    print(f"✅ [{i}/{len(student_ids)}] {student_data['ID Number']}: Score: {student_data['Score']}%")
+                results_csv.write_result(student_data)
+    finally:
+        if progress:
+            progress.close()
+        results_csv.close()
+
+    id_order = {student_id: i for i, student_id in enumerate(student_ids)}
+    all_results.sort(key=lambda r: id_order[r['ID Number']])
+    successful_scans = len(all_results)
+
+    scanned_ids = {r['ID Number'] for r in all_results}
+    for student_id in student_ids:
+        if student_id not in scanned_ids:
             print(f"❌ {student_id}: No images found or processing failed")
 
     # Print summary table
     print_all_results_table(all_results)
 
-    # Save results
-    save_results_to_csv(all_results)
+    if results_csv.filename:
+        print(f"💾 Results saved to: {results_csv.filename}")
 
     print(f"\n📊 Batch scan completed:")
     print(f"   • Total students: {len(student_ids)}")
@@ -416,37 +1026,59 @@ def print_all_results_table(results):
     print(f"   • Students with valid scores: {students_with_marks}")
     print(f"   • Average score: {avg_score:.1f}%")
 
-def save_results_to_csv(results):
-    """Save results to a CSV file"""
-    if not results:
-        return
+RESULTS_FIELDNAMES = ('ID Number', 'Score', 'Final Marks')
 
-    try:
-        import csv
-        from datetime import datetime
+def _results_csv_filename():
+    """Timestamped CSV path in the results directory, creating the directory"""
+    from datetime import datetime
 
-        # Create results directory if it doesn't exist
-        results_dir = config.get_project_root() / "results"
-        results_dir.mkdir(exist_ok=True)
+    # Create results directory if it doesn't exist
+    results_dir = config.get_project_root() / "results"
+    results_dir.mkdir(exist_ok=True)
 
-        # Generate filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        csv_filename = results_dir / f"scan_results_{timestamp}.csv"
+    # Generate filename with timestamp
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return results_dir / f"scan_results_{timestamp}.csv"
 
-        # Write CSV file
-        with open(csv_filename, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['ID Number', 'Score', 'Final Marks']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+class _ResultsCSV:
+    """Results CSV for streaming rows, created when the first row is written
 
-            writer.writeheader()
-            for result in results:
-                writer.writerow(result)
+    A scan that produces no results leaves no file behind. If the file
+    cannot be created a warning is shown once and later rows are dropped.
+    """
 
-        print(f"💾 Results saved to: {csv_filename}")
+    def __init__(self):
+        self.filename = None
+        self._file = None
+        self._writer = None
+        self._failed = False
 
-    except Exception as e:
-        print(f"⚠️  Warning: Could not save results to CSV: {e}")
-        logging.warning(f"Could not save results to CSV: {e}")
+    def write_result(self, student_data):
+        """Append one student record, opening the file on first use"""
+        if self._failed:
+            return
+
+        if self._writer is None:
+            try:
+                import csv
+
+                csv_filename = _results_csv_filename()
+                self._file = open(csv_filename, 'w', newline='', encoding='utf-8')
+                self._writer = csv.writer(self._file)
+                self._writer.writerow(RESULTS_FIELDNAMES)
+                self.filename = csv_filename
+
+            except Exception as e:
+                print(f"⚠️  Warning: Could not save results to CSV: {e}")
+                logging.warning(f"Could not save results to CSV: {e}")
+                self._failed = True
+                return
+
+        self._writer.writerow([student_data[field] for field in RESULTS_FIELDNAMES])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
 
 def main():
     """Main function with options for individual or batch scanning"""
@@ -519,6 +1151,9 @@ def main():
                     except KeyboardInterrupt:
                         print("\n\n👋 Interrupted by user. Goodbye!")
                         return
+                    except EOFError:
+                        print("\n👋 End of input. Goodbye!")
+                        return
                     except Exception as e:
                         print(f"❌ Error: {e}")
                         continue
@@ -539,6 +1174,10 @@ def main():
         except KeyboardInterrupt:
             print("\n\n👋 Interrupted by user. Goodbye!")
             break
+        except EOFError:
+            # stdin closed (e.g. the non-interactive launcher), stop asking
+            print("\n👋 End of input. Goodbye!")
+            break
         except Exception as e:
             print(f"❌ Error: {e}")
             continue
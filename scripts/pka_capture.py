@@ -14,6 +14,8 @@ import subprocess
 from pathlib import Path
 import logging
 import ctypes
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     from PIL import ImageGrab, Image
@@ -21,25 +23,31 @@ try:
     import win32con
     import win32api
     import win32ui
-    import pytesseract
+    import win32process
     from config import get_config
     print("Required modules imported")
 except ImportError as e:
     print(f"Missing modules: {e}")
-    print("Install with: pip install Pillow pywin32 pytesseract opencv-python")
+    print("Install with: pip install Pillow pywin32")
     sys.exit(1)
 
+# mss is optional: when installed, screen regions are grabbed through one
+# reused mss instance instead of a fresh ImageGrab capture per call
+try:
+    import mss
+except ImportError:
+    mss = None
+
+# PyTurboJPEG is optional: when it and libjpeg-turbo are installed, captures
+# are encoded with its SIMD encoder instead of Pillow's JPEG writer
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJPF_BGRX, TJSAMP_420
+except ImportError:
+    TurboJPEG = None
+
 # Get configuration
 config = get_config()
 
-# Configure Tesseract path
-tesseract_path = config.find_tesseract()
-if tesseract_path:
-    pytesseract.pytesseract.tesseract_cmd = tesseract_path
-else:
-    print("Warning: Tesseract OCR not found. OCR functionality may not work.")
-    print("Please install Tesseract from: https://github.com/UB-Mannheim/tesseract/wiki")
-
 # Windows API constants
 SW_HIDE = 0
 SW_RESTORE = 9
@@ -48,24 +56,209 @@ SW_MINIMIZE = 6
 HWND_TOP = 0
 HWND_TOPMOST = -1
 
-# Configure logging
-config.create_directories()
-log_filename = config.get_log_filename('pka_capture')
-logging.basicConfig(
-    level=getattr(logging, config.LOG_LEVEL),
-    format=config.LOG_FORMAT,
-    handlers=[
-        logging.FileHandler(log_filename, encoding='utf-8'),
-        logging.StreamHandler()
+# WaitForInputIdle success result
+WAIT_OBJECT_0 = 0
+
+def _wait_for_input_idle(process, timeout):
+    """Block until a launched process is waiting for user input
+
+    Returns True once its initial windows are up, False on timeout or if
+    the process has no message queue to wait on.
+    """
+    wait_for_input_idle = ctypes.windll.user32.WaitForInputIdle
+    wait_for_input_idle.argtypes = (ctypes.c_void_p, ctypes.c_uint32)
+    wait_for_input_idle.restype = ctypes.c_uint32
+    return wait_for_input_idle(int(process._handle), int(timeout * 1000)) == WAIT_OBJECT_0
+
+# GetDIBits structures and constants
+BI_RGB = 0
+DIB_RGB_COLORS = 0
+
+class BITMAPINFOHEADER(ctypes.Structure):
+    _fields_ = [
+        ('biSize', ctypes.c_uint32),
+        ('biWidth', ctypes.c_int32),
+        ('biHeight', ctypes.c_int32),
+        ('biPlanes', ctypes.c_uint16),
+        ('biBitCount', ctypes.c_uint16),
+        ('biCompression', ctypes.c_uint32),
+        ('biSizeImage', ctypes.c_uint32),
+        ('biXPelsPerMeter', ctypes.c_int32),
+        ('biYPelsPerMeter', ctypes.c_int32),
+        ('biClrUsed', ctypes.c_uint32),
+        ('biClrImportant', ctypes.c_uint32)
     ]
+
+def _wait_for_compositor():
+    """Wait for pending window changes to reach the screen
+
+    Drains this thread's message queue, then blocks in DwmFlush until the
+    desktop compositor presents its next frame (one refresh, ~16 ms). When
+    composition is unavailable this falls back to sleeping CAPTURE_DELAY.
+    """
+    win32gui.PumpWaitingMessages()
+    try:
+        if ctypes.windll.dwmapi.DwmFlush() == 0:
+            return
+    except (AttributeError, OSError):
+        pass
+    time.sleep(config.CAPTURE_DELAY)
+
+# PrintWindow flags in the order tried
+PRINTWINDOW_FLAGS = (
+    3,  # PW_RENDERFULLCONTENT
+    1,  # PW_CLIENTONLY
+    0,  # Default
+    2   # PW_RENDERFULLCONTENT without client
 )
 
+# Side of the pixel grid sampled by the blank-frame check, dense enough to
+# hit a single line of small text on a plain window
+QUALITY_SAMPLE_SIZE = 256
+
+def _capture_stddev(img):
+    """Largest per-row standard deviation over a fixed grid of sampled pixels
+
+    img is a PIL image or an (H, W, 4) BGRX array from PrintWindow. The
+    sample grid is picked in C (a nearest-neighbour resize, or a strided
+    view of the array), so the check costs the same for any capture size.
+    Scoring the most varied sampled row keeps a line of text on an
+    otherwise plain window from being averaged away; blank (black or
+    uniformly filled) frames come out at or near zero.
+    """
+    if isinstance(img, np.ndarray):
+        height, width = img.shape[:2]
+        sample = img[::max(1, height // QUALITY_SAMPLE_SIZE),
+                     ::max(1, width // QUALITY_SAMPLE_SIZE), :3]
+    else:
+        sample = np.asarray(img.convert('RGB').resize((QUALITY_SAMPLE_SIZE, QUALITY_SAMPLE_SIZE),
+                                                      Image.NEAREST))
+    return float(sample.std(axis=1, dtype=np.float32).mean(axis=1).max())
+
+_turbo_jpeg = None
+
+def _get_turbo_jpeg():
+    """Return the shared TurboJPEG encoder, or None to use Pillow"""
+    global _turbo_jpeg, TurboJPEG
+
+    if _turbo_jpeg is None and TurboJPEG is not None:
+        try:
+            _turbo_jpeg = TurboJPEG()
+        except (OSError, RuntimeError) as e:
+            # The Python package is present but the libjpeg-turbo library is not
+            logging.warning(f"TurboJPEG unavailable, using Pillow for JPEG encoding: {e}")
+            TurboJPEG = None
+
+    return _turbo_jpeg
+
+def _write_jpeg(img, save_path):
+    """Encode a capture to JPEG on disk and log the written size
+
+    img is a PIL image or an (H, W, 4) BGRX array from PrintWindow.
+    """
+    turbo_jpeg = _get_turbo_jpeg()
+    if turbo_jpeg is not None:
+        if isinstance(img, np.ndarray):
+            pixels, pixel_format = img, TJPF_BGRX
+        else:
+            pixels, pixel_format = np.ascontiguousarray(np.asarray(img.convert('RGB'))), TJPF_RGB
+        jpeg_bytes = turbo_jpeg.encode(pixels, quality=95, pixel_format=pixel_format,
+                                       jpeg_subsample=TJSAMP_420)
+        with open(save_path, 'wb') as jpeg_file:
+            jpeg_file.write(jpeg_bytes)
+        file_size = len(jpeg_bytes)
+    else:
+        if isinstance(img, np.ndarray):
+            img = Image.frombuffer('RGB', (img.shape[1], img.shape[0]), img, 'raw', 'BGRX', 0, 1)
+        with open(save_path, 'wb') as jpeg_file:
+            img.save(jpeg_file, 'JPEG', quality=95)
+            file_size = jpeg_file.tell()
+
+    # The size comes from the encoder output, not a stat() of the new file
+    logging.info(f"SUCCESS: {os.path.basename(save_path)} ({file_size} bytes)")
+    return save_path
+
+def setup_logging():
+    """Setup logging configuration
+
+    Skipped when the caller (e.g. batch_process) has already configured
+    logging, so capture output flows to its handlers.
+    """
+    if logging.getLogger().handlers:
+        return None
+
+    config.create_directories()
+    log_filename = config.get_log_filename('pka_capture')
+
+    logging.basicConfig(
+        level=getattr(logging, config.LOG_LEVEL),
+        format=config.LOG_FORMAT,
+        handlers=[
+            logging.FileHandler(log_filename, encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
+    return log_filename
+
 class AdvancedPKACapture:
     def __init__(self):
         self.pt_path = self._find_packet_tracer()
         self.process = None
         self.capture_zone = config.CAPTURE_ZONE.copy()
+        self._sct = None
+        self._encoder = None
+        self._pending_saves = []
         
+    def close(self):
+        """Finish pending saves and release the encoder pool and screen grabber
+
+        Returns the number of captures that failed to save.
+        """
+        failed_saves = self.wait_for_saves()
+        if self._encoder is not None:
+            self._encoder.shutdown()
+            self._encoder = None
+        if self._sct is not None:
+            self._sct.close()
+            self._sct = None
+        return failed_saves
+
+    def _save_capture(self, img, save_path):
+        """Queue a capture for JPEG encoding so the next PKA can launch meanwhile"""
+        if self._encoder is None:
+            self._encoder = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1),
+                                               thread_name_prefix='jpeg')
+        self._pending_saves.append(self._encoder.submit(_write_jpeg, img, save_path))
+
+    def wait_for_saves(self):
+        """Wait for queued captures to be written; returns how many failed"""
+        failed_saves = 0
+        for future in self._pending_saves:
+            try:
+                future.result()
+            except Exception as e:
+                failed_saves += 1
+                logging.error(f"Failed to save capture: {e}")
+        self._pending_saves = []
+        return failed_saves
+
+    def _grab_screen(self, rect):
+        """Grab a screen rectangle (left, top, right, bottom) as an RGB image"""
+        if mss is None:
+            return ImageGrab.grab(bbox=rect)
+
+        # Keep one mss instance so its device context setup is paid once
+        if self._sct is None:
+            self._sct = mss.mss()
+        raw = self._sct.grab({
+            'left': rect[0],
+            'top': rect[1],
+            'width': rect[2] - rect[0],
+            'height': rect[3] - rect[1]
+        })
+        return Image.frombytes('RGB', raw.size, raw.bgra, 'raw', 'BGRX')
+
     def _find_packet_tracer(self):
         """Find Cisco Packet Tracer installation"""
         return config.find_packet_tracer()
@@ -97,9 +290,20 @@ class AdvancedPKACapture:
             return False
     
     def _find_pt_windows(self):
-        """Find all Packet Tracer related windows"""
+        """Find all Packet Tracer related windows
+
+        While the launched Packet Tracer process is running, only its own
+        windows are examined, so the title and class lookups are skipped
+        for every other top-level window polled during the launch wait.
+        """
+        pt_pid = None
+        if self.process is not None and self.process.poll() is None:
+            pt_pid = self.process.pid
+
         def enum_callback(hwnd, windows):
             try:
+                if pt_pid is not None and win32process.GetWindowThreadProcessId(hwnd)[1] != pt_pid:
+                    return True
                 if win32gui.IsWindowVisible(hwnd):
                     title = win32gui.GetWindowText(hwnd)
                     class_name = win32gui.GetClassName(hwnd)
@@ -145,25 +349,33 @@ class AdvancedPKACapture:
             if target_height is None:
                 target_height = current_height
 
+            # Each step waits for the compositor's next frame instead of a
+            # fixed sleep: ShowWindow, SetWindowPos and the UPDATENOW redraw
+            # return once the window has handled them, so only presenting
+            # the new frame is left to wait for
+
             # Restore window first
             win32gui.ShowWindow(hwnd, SW_RESTORE)
-            time.sleep(0.1)
+            _wait_for_compositor()
 
             # Set window position and size
             win32gui.SetWindowPos(hwnd, HWND_TOP, target_x, target_y, target_width, target_height,
                                 win32con.SWP_SHOWWINDOW)
-            time.sleep(0.2)
+            _wait_for_compositor()
 
             # Bring to foreground
             win32gui.SetForegroundWindow(hwnd)
-            time.sleep(0.1)
+            _wait_for_compositor()
 
             # Force redraw
             win32gui.UpdateWindow(hwnd)
             win32gui.RedrawWindow(hwnd, None, None,
                                 win32con.RDW_INVALIDATE | win32con.RDW_UPDATENOW |
                                 win32con.RDW_ALLCHILDREN | win32con.RDW_FRAME)
-            time.sleep(0.3)
+            _wait_for_compositor()
+            # Packet Tracer repaints in its own process, which a compositor
+            # frame doesn't wait for, so keep the full settle time here
+            time.sleep(config.CAPTURE_DELAY)
 
             # Verify position
             new_rect = win32gui.GetWindowRect(hwnd)
@@ -175,6 +387,83 @@ class AdvancedPKACapture:
             logging.error(f"Failed to position window: {e}")
             return False
 
+    def _capture_with_printwindow(self, hwnd, save_path):
+        """Render the window with PrintWindow into one bitmap, trying each flag
+
+        The device contexts and bitmap are created once and reused for every
+        flag, and released even if a call raises. Returns True on success.
+        """
+        rect = win32gui.GetWindowRect(hwnd)
+        width = rect[2] - rect[0]
+        height = rect[3] - rect[1]
+
+        # Get device context
+        hwndDC = win32gui.GetWindowDC(hwnd)
+        try:
+            mfcDC = win32ui.CreateDCFromHandle(hwndDC)
+            saveDC = mfcDC.CreateCompatibleDC()
+
+            # Create bitmap
+            saveBitMap = win32ui.CreateBitmap()
+            saveBitMap.CreateCompatibleBitmap(mfcDC, width, height)
+            previous_bitmap = saveDC.SelectObject(saveBitMap)
+
+            # 32-bit top-down BGRX pixels are copied straight into this array,
+            # reused for every flag until one passes the quality check
+            bgrx = np.empty((height, width, 4), dtype=np.uint8)
+            bitmap_info = BITMAPINFOHEADER(
+                biSize=ctypes.sizeof(BITMAPINFOHEADER), biWidth=width, biHeight=-height,
+                biPlanes=1, biBitCount=32, biCompression=BI_RGB
+            )
+
+            try:
+                # PW_RENDERFULLCONTENT is tried first since it almost always works
+                for flag in PRINTWINDOW_FLAGS:
+                    img, stddev = self._try_printwindow(hwnd, saveDC, saveBitMap, previous_bitmap,
+                                                        bgrx, bitmap_info, flag)
+                    if img is None:
+                        continue
+
+                    self._save_capture(img, save_path)
+                    logging.info(f"PrintWindow successful (flag {flag}): stddev {stddev:.1f}")
+                    return True
+            finally:
+                # Cleanup
+                win32gui.DeleteObject(saveBitMap.GetHandle())
+                saveDC.DeleteDC()
+                mfcDC.DeleteDC()
+        finally:
+            win32gui.ReleaseDC(hwnd, hwndDC)
+
+        return False
+
+    def _try_printwindow(self, hwnd, saveDC, saveBitMap, previous_bitmap, bgrx, bitmap_info, flag):
+        """One PrintWindow call read back into bgrx
+
+        Returns (bgrx, stddev) if the frame passes the quality check, else
+        (None, stddev).
+        """
+        if not ctypes.windll.user32.PrintWindow(hwnd, saveDC.GetSafeHdc(), flag):
+            return None, 0.0
+
+        # GetDIBits needs the bitmap deselected from the memory DC
+        saveDC.SelectObject(previous_bitmap)
+        try:
+            lines = ctypes.windll.gdi32.GetDIBits(
+                saveDC.GetSafeHdc(), saveBitMap.GetHandle(), 0, bgrx.shape[0],
+                ctypes.c_void_p(bgrx.ctypes.data), ctypes.byref(bitmap_info), DIB_RGB_COLORS
+            )
+        finally:
+            saveDC.SelectObject(saveBitMap)
+        if lines != bgrx.shape[0]:
+            return None, 0.0
+
+        # Quality check
+        stddev = _capture_stddev(bgrx)
+        if stddev > config.CAPTURE_MIN_STDDEV:
+            return bgrx, stddev
+        return None, stddev
+
     def _capture_with_multiple_methods(self, hwnd, save_path):
         """Try multiple capture methods for best results"""
         methods_tried = []
@@ -187,18 +476,17 @@ class AdvancedPKACapture:
             rect = win32gui.GetWindowRect(hwnd)
 
             # Capture the exact window area
-            screenshot = ImageGrab.grab(bbox=rect)
+            screenshot = self._grab_screen(rect)
 
             # Quality check
-            colors = screenshot.getcolors(maxcolors=256*256*256)
-            color_count = len(colors) if colors else 0
+            stddev = _capture_stddev(screenshot)
 
-            if color_count > 100:
-                screenshot.save(save_path, 'JPEG', quality=95)
-                logging.info(f"Screen capture successful: {color_count} colors")
+            if stddev > config.CAPTURE_MIN_STDDEV:
+                self._save_capture(screenshot, save_path)
+                logging.info(f"Screen capture successful: stddev {stddev:.1f}")
                 return True
             else:
-                methods_tried.append(f"Screen capture: {color_count} colors (insufficient)")
+                methods_tried.append(f"Screen capture: stddev {stddev:.1f} (blank frame)")
 
         except Exception as e:
             methods_tried.append(f"Screen capture failed: {e}")
@@ -207,61 +495,8 @@ class AdvancedPKACapture:
         try:
             logging.info("Method 2: Enhanced PrintWindow")
 
-            rect = win32gui.GetWindowRect(hwnd)
-            width = rect[2] - rect[0]
-            height = rect[3] - rect[1]
-
-            # Get device context
-            hwndDC = win32gui.GetWindowDC(hwnd)
-            mfcDC = win32ui.CreateDCFromHandle(hwndDC)
-            saveDC = mfcDC.CreateCompatibleDC()
-
-            # Create bitmap
-            saveBitMap = win32ui.CreateBitmap()
-            saveBitMap.CreateCompatibleBitmap(mfcDC, width, height)
-            saveDC.SelectObject(saveBitMap)
-
-            # Try different PrintWindow flags
-            flags_to_try = [
-                3,  # PW_RENDERFULLCONTENT
-                1,  # PW_CLIENTONLY
-                0,  # Default
-                2   # PW_RENDERFULLCONTENT without client
-            ]
-
-            for flag in flags_to_try:
-                result = ctypes.windll.user32.PrintWindow(hwnd, saveDC.GetSafeHdc(), flag)
-                if result:
-                    bmpinfo = saveBitMap.GetInfo()
-                    bmpstr = saveBitMap.GetBitmapBits(True)
-
-                    img = Image.frombuffer(
-                        'RGB',
-                        (bmpinfo['bmWidth'], bmpinfo['bmHeight']),
-                        bmpstr, 'raw', 'BGRX', 0, 1
-                    )
-
-                    # Quality check
-                    colors = img.getcolors(maxcolors=256*256*256)
-                    color_count = len(colors) if colors else 0
-
-                    if color_count > 50:
-                        img.save(save_path, 'JPEG', quality=95)
-
-                        # Cleanup
-                        win32gui.DeleteObject(saveBitMap.GetHandle())
-                        saveDC.DeleteDC()
-                        mfcDC.DeleteDC()
-                        win32gui.ReleaseDC(hwnd, hwndDC)
-
-                        logging.info(f"PrintWindow successful (flag {flag}): {color_count} colors")
-                        return True
-
-            # Cleanup on failure
-            win32gui.DeleteObject(saveBitMap.GetHandle())
-            saveDC.DeleteDC()
-            mfcDC.DeleteDC()
-            win32gui.ReleaseDC(hwnd, hwndDC)
+            if self._capture_with_printwindow(hwnd, save_path):
+                return True
 
             methods_tried.append("PrintWindow: All flags failed")
 
@@ -278,13 +513,12 @@ class AdvancedPKACapture:
 
             # Capture
             rect = win32gui.GetWindowRect(hwnd)
-            screenshot = ImageGrab.grab(bbox=rect)
+            screenshot = self._grab_screen(rect)
 
             # Save regardless of quality for debugging
-            screenshot.save(save_path, 'JPEG', quality=95)
+            self._save_capture(screenshot, save_path)
 
-            file_size = os.path.getsize(save_path)
-            logging.info(f"Force capture completed: {file_size} bytes")
+            logging.info("Force capture completed")
             return True
 
         except Exception as e:
@@ -303,10 +537,21 @@ class AdvancedPKACapture:
             logging.info(f"Launching: {os.path.basename(pka_file)}")
 
             # Launch with normal visibility for better window management
+            self.process = None
             self.process = subprocess.Popen([self.pt_path, pka_file])
 
-            # Wait for initial loading
-            time.sleep(config.LAUNCH_WAIT_TIME)
+            # Wait for initial loading: return as soon as Packet Tracer is
+            # idle instead of always sleeping LAUNCH_WAIT_TIME
+            launch_started = time.monotonic()
+            try:
+                idle = _wait_for_input_idle(self.process, config.LAUNCH_WAIT_TIME)
+            except (AttributeError, OSError) as e:
+                logging.debug(f"WaitForInputIdle unavailable: {e}")
+                idle = False
+            if idle:
+                logging.info(f"Packet Tracer ready after {time.monotonic() - launch_started:.1f}s")
+            else:
+                time.sleep(max(0, config.LAUNCH_WAIT_TIME - (time.monotonic() - launch_started)))
 
             # Wait for PT Activity windows to appear
             max_wait = config.WINDOW_WAIT_TIME
@@ -370,13 +615,23 @@ class AdvancedPKACapture:
             if not self._setup_capture_environment():
                 return False
 
-            # Launch and wait for windows
-            activity_windows, _ = self._launch_and_wait(pka_file)
+            # Launch and wait for windows, relaunching with exponential
+            # backoff if Packet Tracer starts but shows no activity window
+            for attempt in range(config.LAUNCH_ATTEMPTS):
+                activity_windows, _ = self._launch_and_wait(pka_file)
+                if activity_windows:
+                    break
 
-            if not activity_windows:
                 logging.error("No PT Activity windows found")
                 self._cleanup_all()
-                return False
+
+                # A launch that never started a process will not succeed on retry
+                if self.process is None or attempt == config.LAUNCH_ATTEMPTS - 1:
+                    return False
+
+                delay = 2 ** (attempt + 1)
+                logging.info(f"Retrying launch in {delay}s (attempt {attempt + 2}/{config.LAUNCH_ATTEMPTS})")
+                time.sleep(delay)
 
             # Use the smallest activity window (likely the instruction window)
             hwnd, title, width, height, _, _ = activity_windows[0]
@@ -400,9 +655,10 @@ class AdvancedPKACapture:
             # Cleanup
             self._cleanup_all()
 
-            if success and os.path.exists(screenshot_path):
-                file_size = os.path.getsize(screenshot_path)
-                logging.info(f"SUCCESS: {os.path.basename(screenshot_path)} ({file_size} bytes)")
+            # The JPEG is written by the encoder pool; call wait_for_saves()
+            # or close() before reading it
+            if success:
+                logging.info(f"Captured: {os.path.basename(screenshot_path)} (saving in background)")
                 return screenshot_path
             else:
                 logging.error("Capture process failed")
@@ -415,6 +671,7 @@ class AdvancedPKACapture:
 
 def main():
     """Main function with advanced virtual monitor capture"""
+    setup_logging()
     logging.info("=== PKA Advanced Virtual Monitor Capture v3.4 ===")
 
     # Setup - use project root directories
@@ -448,21 +705,27 @@ def main():
     successful = 0
     failed = 0
 
-    for i, pka_file in enumerate(pka_files, 1):
-        logging.info(f"\n=== Processing {i}/{len(pka_files)}: {pka_file.name} ===")
+    try:
+        for i, pka_file in enumerate(pka_files, 1):
+            logging.info(f"\n=== Processing {i}/{len(pka_files)}: {pka_file.name} ===")
 
-        result = capture.capture_pka_advanced(str(pka_file), str(output_dir))
+            result = capture.capture_pka_advanced(str(pka_file), str(output_dir))
 
-        if result:
-            successful += 1
-            logging.info(f"✓ SUCCESS: {pka_file.name}")
-        else:
-            failed += 1
-            logging.error(f"✗ FAILED: {pka_file.name}")
-
-        # Pause between files
-        if i < len(pka_files):
-            time.sleep(3)
+            if result:
+                successful += 1
+                logging.info(f"✓ SUCCESS: {pka_file.name}")
+            else:
+                failed += 1
+                logging.error(f"✗ FAILED: {pka_file.name}")
+
+            # Pause between files
+            if i < len(pka_files):
+                time.sleep(3)
+    finally:
+        # Captures are encoded in the background; count any that failed to save
+        failed_saves = capture.close()
+        successful -= failed_saves
+        failed += failed_saves
 
     # Summary
     logging.info(f"\n=== FINAL RESULTS ===")
@@ -4,7 +4,7 @@ Setup script for Packet Tracer Mark Scanner
 Version: 0.1
 """
 
-from setuptools import setup, find_packages
+from setuptools import setup
 import os
 
 # Read the README file for long description
@@ -12,10 +12,14 @@ def read_readme():
     with open("README.md", "r", encoding="utf-8") as fh:
         return fh.read()
 
-# Read requirements from requirements.txt
-def read_requirements():
-    with open("requirements.txt", "r", encoding="utf-8") as fh:
-        return [line.strip() for line in fh if line.strip() and not line.startswith("#")]
+# Core requirements; keep in sync with requirements.txt
+INSTALL_REQUIRES = [
+    "opencv-python>=4.5.0",
+    "pytesseract>=0.3.8",
+    "Pillow>=8.0.0",
+    "pywin32>=227",
+    "numpy>=1.20.0",
+]
 
 setup(
     name="packet-tracer-mark-scanner",
@@ -26,7 +30,8 @@ setup(
     long_description=read_readme(),
     long_description_content_type="text/markdown",
     url="https://github.com/askbard/packetracermark",
-    packages=find_packages(),
+    packages=["scripts"],
+    py_modules=["run"],
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Intended Audience :: Education",
@@ -42,7 +47,16 @@ setup(
         "Operating System :: Microsoft :: Windows",
     ],
     python_requires=">=3.7",
-    install_requires=read_requirements(),
+    install_requires=INSTALL_REQUIRES,
+    extras_require={
+        # Optional accelerators, each used only when installed
+        "fast": [
+            "tesserocr>=2.5.0",
+            "mss>=6.0.0",
+            "PyTurboJPEG>=1.6.0",
+            "tqdm>=4.0.0",
+        ],
+    },
     entry_points={
         "console_scripts": [
             "pka-launcher=run:main",
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Scripts import their siblings (e.g. config) by bare module name
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
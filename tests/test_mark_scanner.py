@@ -0,0 +1,67 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+import mark_scanner
+
+
+# Completion percentage read by each PSM mode from each fake preprocessing
+# output, keyed by the output's fill value
+FAKE_PERCENTAGES = {
+    1: {3: 50, 6: 80, 7: 50},
+    2: {3: 80, 6: 80, 7: 0},
+}
+
+
+def _fake_text(img, psm):
+    return f"Completion: {FAKE_PERCENTAGES[int(img[0, 0])][psm]}%"
+
+
+@pytest.fixture
+def fake_grid(monkeypatch):
+    """Three preprocessing methods, the third a pixel-identical copy of the first"""
+    monkeypatch.setattr(mark_scanner, "PREPROCESSING_METHODS", [
+        ("A", lambda img, out: np.copyto(out, 1) or out),
+        ("B", lambda img, out: np.copyto(out, 2) or out),
+        ("A copy", lambda img, out: np.copyto(out, 1) or out),
+    ])
+    monkeypatch.setattr(mark_scanner, "PSM_MODES", mark_scanner.PSM_MODES[:3])
+    monkeypatch.setattr(mark_scanner, "ocr_image",
+                        lambda img, psm, psm_config: _fake_text(img, psm))
+    monkeypatch.setattr(mark_scanner, "_ocr_images_uncached",
+                        lambda images, psm, psm_config: [_fake_text(img, psm) for img in images])
+    monkeypatch.setattr(mark_scanner, "_ocr_cache", OrderedDict())
+    monkeypatch.setattr(mark_scanner, "_ocr_cache_dirty", False)
+    monkeypatch.setattr(mark_scanner.config, "COMPLETION_ROI", None)
+    monkeypatch.setattr(mark_scanner.config, "CONSENSUS_EARLY_STOP", True)
+    monkeypatch.setattr(mark_scanner.config, "CONSENSUS_MIN_RESULTS", 3)
+    monkeypatch.setattr(mark_scanner.config, "CONSENSUS_TOLERANCE", 2)
+
+    gray = np.zeros((8, 8), dtype=np.uint8)
+    monkeypatch.setattr(mark_scanner, "_read_gray", lambda image_path: gray)
+    return gray
+
+
+def test_single_and_batch_paths_agree_with_duplicate_method(fake_grid):
+    single_score, _ = mark_scanner._extract_from_gray(fake_grid, "s1234.png")
+    batch_scores = mark_scanner._scan_chunk([("s1234", "s1234.png")])
+
+    # Counting A then B reaches three 80s before a third 50
+    assert single_score == batch_scores["s1234"] == 80
+
+
+def test_student_ids_keep_file_name_case(tmp_path):
+    (tmp_path / "AB1234.png").touch()
+    (tmp_path / "24075450.JPG").touch()
+
+    assert mark_scanner.get_all_student_ids_from_images(tmp_path) == ["24075450", "AB1234"]
+    assert mark_scanner.find_images_for_id("AB1234", tmp_path)["MAIN"].endswith("AB1234.png")
+
+
+@pytest.mark.skipif(os.name != "nt", reason="filenames are case-insensitive on Windows only")
+def test_image_lookup_ignores_case_on_windows(tmp_path):
+    (tmp_path / "S1234_AT1.JPG").touch()
+
+    assert mark_scanner.find_images_for_id("s1234_at1", tmp_path)["MAIN"].endswith("S1234_AT1.JPG")
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+# pka_capture exits at import without the Windows capture modules
+pytest.importorskip("win32gui")
+cv2 = pytest.importorskip("cv2")
+from PIL import Image
+
+import pka_capture
+
+
+def _bgrx(height, width, value):
+    return np.full((height, width, 4), value, dtype=np.uint8)
+
+
+@pytest.mark.parametrize("value", [0, 255, 128])
+def test_blank_frame_is_rejected(value):
+    frame = _bgrx(1080, 1920, value)
+
+    assert pka_capture._capture_stddev(frame) <= pka_capture.config.CAPTURE_MIN_STDDEV
+    assert (pka_capture._capture_stddev(Image.fromarray(frame[..., :3]))
+            <= pka_capture.config.CAPTURE_MIN_STDDEV)
+
+
+@pytest.mark.parametrize("height, width", [(768, 1024), (1080, 1920), (1440, 2560)])
+def test_text_on_white_frame_is_accepted(height, width):
+    frame = _bgrx(height, width, 255)
+    cv2.putText(frame, "Completion: 85%", (20, height // 2),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 0, 0), 1)
+
+    assert pka_capture._capture_stddev(frame) > pka_capture.config.CAPTURE_MIN_STDDEV
+    assert (pka_capture._capture_stddev(Image.fromarray(np.ascontiguousarray(frame[..., :3])))
+            > pka_capture.config.CAPTURE_MIN_STDDEV)